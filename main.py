@@ -1,32 +1,126 @@
 import sys
 import os
-import toml
 import json
+import re
+import hashlib
+import threading
+import functools
+import types
+import time
 import urllib.request
-import urllib.error
-from typing import Any, Dict, List, Tuple
-
-REQUIRED_PARAMS = {
-    "package_name": str,
-    "repository_url": str,
-    "repo_mode": str,
-    "package_version": str,
-    "max_depth": int,
-}
-
-ALLOWED_REPO_MODES = {"local", "remote"}
+from urllib.parse import quote, unquote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
+import urllib3
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+REQUIRED_PARAMS: Tuple[Tuple[str, type], ...] = (
+    ("package_name", str),
+    ("repository_url", str),
+    ("repo_mode", str),
+    ("package_version", str),
+    ("max_depth", int),
+)
+
+ALLOWED_REPO_MODES = frozenset({"local", "remote"})
+
+FETCH_WORKERS = 16
+
+# Путь обхода - связный список (имя, родитель): шаг вглубь не копирует весь путь.
+PathLink = Optional[Tuple[str, Any]]
+
+REGISTRY_URL = "https://registry.npmjs.org"
+HTTP_TIMEOUT = 10.0
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.3
+REDIRECT_LIMIT = 5
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "depviz", "npmMetadata", "v2")
+CACHE_HEADER_LIMIT = 1024
+PINNED_VERSION_RE = re.compile(r"^\d+\.\d+\.\d+(?:[-+][0-9A-Za-z.+-]+)?$")
+
+MEMO_SIZE = 4096
+MEMO_TTL = 300
+
+def _make_pool_manager() -> urllib3.PoolManager:
+    options: Dict[str, Any] = {
+        "num_pools": 4,
+        "maxsize": FETCH_WORKERS,
+        "timeout": HTTP_TIMEOUT,
+        "retries": urllib3.Retry(total=HTTP_RETRIES, redirect=REDIRECT_LIMIT, backoff_factor=HTTP_BACKOFF),
+    }
+    # Как и urllib.request.urlopen, учитываем HTTPS_PROXY / NO_PROXY из окружения.
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(urlsplit(REGISTRY_URL).hostname):
+        return urllib3.PoolManager(**options)
+
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    proxy_headers = None
+    if parts.username is not None:
+        credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        proxy_headers = urllib3.make_headers(proxy_basic_auth=credentials)
+    proxy_url = f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+    return urllib3.ProxyManager(proxy_url, proxy_headers=proxy_headers, **options)
+
+
+# Параллельность обеспечивается пулом HTTP/1.1 keep-alive соединений urllib3: по
+# одному на поток загрузки, так что одновременно в работе до FETCH_WORKERS запросов.
+# HTTP/2 (httpx) дал бы те же FETCH_WORKERS запросов в полёте, только по одному
+# сокету, но был бы вторым транспортом со своими прокси, редиректами, повторами
+# и TLS. orjson, в отличие от него, лишь подменяет разбор JSON.
+_HTTP = _make_pool_manager()
+_ACCEPT_ENCODING = urllib3.make_headers(accept_encoding=True)
+
+
+def _type_error_message(key: str, expected_type: type, value: Any) -> str:
+    return (f"Параметр '{key}' должен быть типа {expected_type.__name__}, "
+            f"получен {type(value).__name__}")
+
+
+def _compile_params_check(params: Tuple[Tuple[str, type], ...]) -> Callable[[Dict[str, Any]], None]:
+    # Схема конфигурации фиксирована, поэтому проверка наличия и типов
+    # генерируется один раз в виде линейного кода без обхода словаря.
+    namespace: Dict[str, Any] = {"_type_error_message": _type_error_message}
+    lines = ["def _check_params(config):", "    missing = None"]
+    for index, (key, expected_type) in enumerate(params):
+        type_name = f"_type_{index}"
+        namespace[type_name] = expected_type
+        lines += [
+            f"    if {key!r} not in config:",
+            "        if missing is None:",
+            "            missing = []",
+            f"        missing.append({key!r})",
+            f"    elif not isinstance(config[{key!r}], {type_name}):",
+            f"        raise TypeError(_type_error_message({key!r}, {type_name}, config[{key!r}]))",
+        ]
+    lines += [
+        "    if missing is not None:",
+        "        raise KeyError('Отсутствуют обязательные параметры: ' + ', '.join(missing))",
+    ]
+    exec("\n".join(lines), namespace)
+    return namespace["_check_params"]
+
+
+_check_params = _compile_params_check(REQUIRED_PARAMS)
 
 
 def validate_config(config: Dict[str, Any]) -> None:
-    missing = []
-    for key, expected_type in REQUIRED_PARAMS.items():
-        if key not in config:
-            missing.append(key)
-        elif not isinstance(config[key], expected_type):
-            raise TypeError(f"Параметр '{key}' должен быть типа {expected_type.__name__}, "
-                            f"получен {type(config[key]).__name__}")
-    if missing:
-        raise KeyError(f"Отсутствуют обязательные параметры: {', '.join(missing)}")
+    _check_params(config)
 
     mode = config["repo_mode"]
     if mode not in ALLOWED_REPO_MODES:
@@ -37,115 +131,332 @@ def validate_config(config: Dict[str, Any]) -> None:
         raise ValueError("max_depth не может быть отрицательным")
 
 
-def fetch_package_remote(package_name: str, version: str) -> Dict[str, Any]:
-    url = f"https://registry.npmjs.org/{package_name}/{version}"
+def _registry_get(path: str, headers: Dict[str, str]) -> Tuple[urllib3.HTTPResponse, bytes]:
+    # Соединения с реестром переиспользуются между запросами (keep-alive),
+    # чтобы не платить за TCP+TLS рукопожатие на каждый пакет; сжатые ответы
+    # urllib3 распаковывает сам.
+    response = _HTTP.request("GET", REGISTRY_URL + path, headers={**_ACCEPT_ENCODING, **headers})
+    return response, response.data
+
+
+def _cache_path(package_name: str, version: str) -> str:
+    digest = hashlib.sha1(f"{package_name}@{version}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.json")
+
+
+def _read_cache_meta(cache_path: str) -> Optional[Dict[str, Any]]:
+    # Первая строка файла кэша - заголовки ответа (ETag, Last-Modified),
+    # поэтому для условного запроса тело манифеста читать не нужно.
     try:
-        with urllib.request.urlopen(url, timeout=10) as response:
-            return json.load(response)
-    except urllib.error.HTTPError as e:
-        raise RuntimeError(f"HTTP ошибка для {package_name}@{version}: {e}")
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Сетевая ошибка для {package_name}@{version}: {e}")
-    except json.JSONDecodeError as e:
+        with open(cache_path, "rb") as f:
+            meta = _json_loads(f.readline(CACHE_HEADER_LIMIT))
+    except (OSError, ValueError):
+        return None
+    return meta if isinstance(meta, dict) else None
+
+
+def _read_cache_body(cache_path: str) -> Optional[bytes]:
+    try:
+        with open(cache_path, "rb") as f:
+            f.readline()
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_cache(cache_path: str, response: urllib3.HTTPResponse, body: bytes) -> None:
+    meta = {
+        "etag": response.headers.get("ETag"),
+        "modified": response.headers.get("Last-Modified"),
+        "cachedAt": time.time(),
+    }
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(_json_dumps(meta) + b"\n")
+            f.write(body)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _parse_manifest(package_name: str, version: str, body: bytes) -> Dict[str, Any]:
+    try:
+        data = _json_loads(body)
+    except ValueError as e:
         raise RuntimeError(f"Некорректный JSON для {package_name}@{version}: {e}")
+    if not isinstance(data, dict):
+        raise RuntimeError(f"Некорректный JSON для {package_name}@{version}: ожидался объект")
+    return data
+
+
+def _validate_dependencies(package_name: str, version: str, deps: Any) -> Dict[str, str]:
+    if not isinstance(deps, dict) or not all(
+            isinstance(dep_name, str) and isinstance(dep_version, str) for dep_name, dep_version in deps.items()):
+        raise RuntimeError(f"Некорректное поле dependencies для {package_name}@{version}")
+    return deps
+
+
+def _read_cached_manifest(package_name: str, version: str, cache_path: str) -> Optional[Dict[str, Any]]:
+    # Повреждённая запись кэша считается промахом: манифест загружается заново.
+    body = _read_cache_body(cache_path)
+    if body is None:
+        return None
+    try:
+        data = _parse_manifest(package_name, version, body)
+        _validate_dependencies(package_name, version, get_dependencies(data))
+    except RuntimeError:
+        return None
+    return data
+
+
+def _extract_dependencies(package_name: str, version: str, body: bytes) -> Dict[str, str]:
+    deps = get_dependencies(_parse_manifest(package_name, version, body))
+    return _validate_dependencies(package_name, version, deps)
+
+
+def _manifest_path(package_name: str, version: str) -> str:
+    # Косая черта в имени scoped-пакета (@types/node) кодируется, как это делает npm.
+    return "/" + quote(package_name, safe="@") + "/" + quote(version, safe="")
+
+
+def _request_manifest(package_name: str, version: str,
+                      headers: Dict[str, str]) -> Tuple[urllib3.HTTPResponse, bytes]:
+    try:
+        return _registry_get(_manifest_path(package_name, version), headers)
+    except urllib3.exceptions.HTTPError as e:
+        raise RuntimeError(f"Сетевая ошибка для {package_name}@{version}: {e}")
     except Exception as e:
         raise RuntimeError(f"Неизвестная ошибка при загрузке {package_name}@{version}: {e}")
 
 
-def fetch_package_local(local_repo_path: str, package_name: str, version: str) -> Dict[str, Any]:
+def _download_package_remote(package_name: str, version: str) -> Dict[str, Any]:
+    cache_path = _cache_path(package_name, version)
+    meta = _read_cache_meta(cache_path)
+
+    # Манифест точной версии в реестре не меняется - сеть не нужна.
+    if meta is not None and PINNED_VERSION_RE.match(version):
+        cached = _read_cached_manifest(package_name, version, cache_path)
+        if cached is not None:
+            return cached
+        meta = None
+
+    headers: Dict[str, str] = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("modified"):
+            headers["If-Modified-Since"] = meta["modified"]
+
+    response, body = _request_manifest(package_name, version, headers)
+    if response.status == 304 and headers:
+        cached = _read_cached_manifest(package_name, version, cache_path)
+        if cached is not None:
+            return cached
+        response, body = _request_manifest(package_name, version, {})
+
+    if response.status != 200:
+        raise RuntimeError(f"HTTP ошибка для {package_name}@{version}: {response.status} {response.reason}")
+    # Программе нужно только поле dependencies: README, tarball и прочие
+    # метаданные не хранятся ни в памяти, ни в кэше.
+    data = {"dependencies": _extract_dependencies(package_name, version, body)}
+    _write_cache(cache_path, response, _json_dumps(data))
+    return data
+
+
+def _memo_bucket() -> int:
+    return int(time.time() // MEMO_TTL)
+
+
+def _freeze_manifest(data: Mapping[str, Any]) -> Mapping[str, Any]:
+    # MappingProxyType защищает только верхний уровень, поэтому dependencies
+    # копируется и закрывается отдельно: мемоизированный результат общий для всех.
+    return types.MappingProxyType({"dependencies": types.MappingProxyType(dict(get_dependencies(data)))})
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _fetch_remote_cached(package_name: str, version: str, bucket: int) -> Mapping[str, Any]:
+    return _freeze_manifest(_download_package_remote(package_name, version))
+
+
+def fetch_package_remote(package_name: str, version: str) -> Mapping[str, Any]:
+    return _fetch_remote_cached(package_name, version, _memo_bucket())
+
+
+@functools.lru_cache(maxsize=4)
+def _load_local_repo(local_repo_path: str, bucket: int) -> Dict[str, Any]:
     if not os.path.isfile(local_repo_path):
         raise RuntimeError(f"Локальный файл репозитория не найден: {local_repo_path}")
     try:
-        with open(local_repo_path, "r", encoding="utf-8") as f:
-            repo_data = json.load(f)
+        with open(local_repo_path, "rb") as f:
+            return _json_loads(f.read())
     except Exception as e:
         raise RuntimeError(f"Ошибка чтения локального репозитория: {e}")
 
+
+def _read_package_local(local_repo_path: str, package_name: str, version: str) -> Dict[str, Any]:
+    repo_data = _load_local_repo(local_repo_path, _memo_bucket())
     key = f"{package_name}@{version}"
     if key not in repo_data:
         raise RuntimeError(f"Пакет {key} отсутствует в локальном репозитории")
     return repo_data[key]
 
 
-def get_dependencies(pkg_data: Dict[str, Any]) -> Dict[str, str]:
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _fetch_local_cached(local_repo_path: str, package_name: str, version: str, bucket: int) -> Mapping[str, Any]:
+    return _freeze_manifest(_read_package_local(local_repo_path, package_name, version))
+
+
+def fetch_package_local(local_repo_path: str, package_name: str, version: str) -> Mapping[str, Any]:
+    return _fetch_local_cached(local_repo_path, package_name, version, _memo_bucket())
+
+
+class DependencyGraph:
+    # Узлы хранятся как целочисленные id; прямые и обратные списки смежности
+    # заполняются за один проход при добавлении пакета.
+    def __init__(self) -> None:
+        self.pair_ids: Dict[Tuple[str, str], int] = {}
+        self.node_labels: List[str] = []
+        self.forward: Dict[int, List[int]] = {}
+        self.reverse: Dict[int, List[int]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.forward)
+
+    def intern(self, name: str, version: str) -> int:
+        # Метка "имя@версия" строится один раз на уникальную пару.
+        pair = (name, version)
+        node_id = self.pair_ids.get(pair)
+        if node_id is None:
+            label = sys.intern(f"{name}@{version}")
+            node_id = self.pair_ids[pair] = len(self.node_labels)
+            self.node_labels.append(label)
+        return node_id
+
+    def add_package(self, src: int, deps: Mapping[str, str]) -> None:
+        targets = self.forward[src] = []
+        for dep_name, dep_version in deps.items():
+            dst = self.intern(dep_name, dep_version)
+            targets.append(dst)
+            self.reverse.setdefault(dst, []).append(src)
+
+
+def _path_names(path: PathLink) -> Set[str]:
+    names: Set[str] = set()
+    while path is not None:
+        names.add(path[0])
+        path = path[1]
+    return names
+
+
+def _path_trail(path: PathLink) -> List[str]:
+    trail: List[str] = []
+    while path is not None:
+        trail.append(path[0])
+        path = path[1]
+    trail.reverse()
+    return trail
+
+
+def _fetch_or_error(fetch: Callable[..., Mapping[str, Any]], *args: str) -> Union[Mapping[str, Any], RuntimeError]:
+    try:
+        return fetch(*args)
+    except RuntimeError as e:
+        return e
+
+
+def get_dependencies(pkg_data: Mapping[str, Any]) -> Mapping[str, str]:
     return pkg_data.get("dependencies", {})
 
 
-def build_dependency_graph(config: Dict[str, Any]) -> Dict[str, List[Tuple[str, str]]]:
+def build_dependency_graph(config: Dict[str, Any]) -> DependencyGraph:
     mode = config["repo_mode"]
     start_name = config["package_name"]
     start_version = config["package_version"]
     max_depth = config["max_depth"]
     repo_path = config["repository_url"]
 
-    graph: Dict[str, List[Tuple[str, str]]] = {}
-    stack: List[Tuple[str, str, int, List[str]]] = [(start_name, start_version, 0, [start_name])]
+    graph = DependencyGraph()
+    frontier: List[Tuple[str, str, int, PathLink]] = [(start_name, start_version, 0, (start_name, None))]
     visited_global: set = set()
+    # Все предки узла уже посещены, поэтому имя, которого нет среди посещённых,
+    # не может замкнуть цикл. Для остальных имён множество предков узла строится
+    # один раз (O(depth) на узел), после чего каждая проверка ребра - O(1).
+    visited_names: set = set()
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        while frontier:
+            level: List[Tuple[int, str, str, int, PathLink]] = []
+            for name, version, depth, path in frontier:
+                node_id = graph.intern(name, version)
+                if node_id in visited_global:
+                    continue
+                visited_global.add(node_id)
+                visited_names.add(name)
+                level.append((node_id, name, version, depth, path))
 
-    def node_key(name: str, version: str) -> str:
-        return f"{name}@{version}"
-
-    while stack:
-        name, version, depth, path = stack.pop()
-        current_key = node_key(name, version)
-
-        if current_key in visited_global:
-            continue
-        visited_global.add(current_key)
-
-        try:
             if mode == "remote":
-                pkg_data = fetch_package_remote(name, version)
+                results = list(executor.map(
+                    lambda item: _fetch_or_error(fetch_package_remote, item[1], item[2]), level))
             else:
-                pkg_data = fetch_package_local(repo_path, name, version)
-        except RuntimeError as e:
-            print(f"Пропущен пакет {current_key}: {e}", file=sys.stderr)
-            continue
-
-        deps = get_dependencies(pkg_data)
-        graph[current_key] = [(dep_name, dep_version) for dep_name, dep_version in deps.items()]
-
-        if depth >= max_depth:
-            continue
-
-        for dep_name, dep_version in deps.items():
-            if dep_name in path:
-                print(f"Цикл обнаружен и пропущен: {' → '.join(path + [dep_name])}", file=sys.stderr)
-                continue
-            stack.append((dep_name, dep_version, depth + 1, path + [dep_name]))
+                results = [_fetch_or_error(fetch_package_local, repo_path, name, version)
+                           for _, name, version, _, _ in level]
+
+            next_frontier: List[Tuple[str, str, int, PathLink]] = []
+            for (node_id, name, version, depth, path), pkg_data in zip(level, results):
+                if isinstance(pkg_data, RuntimeError):
+                    print(f"Пропущен пакет {graph.node_labels[node_id]}: {pkg_data}", file=sys.stderr)
+                    continue
+
+                deps = get_dependencies(pkg_data)
+                graph.add_package(node_id, deps)
+
+                # Узлы глубже max_depth в очередь не попадают вовсе, а узлы на
+                # глубине max_depth загружаются только ради их прямых зависимостей в выводе.
+                if depth >= max_depth:
+                    continue
+
+                ancestors: Optional[Set[str]] = None
+                for dep_name, dep_version in deps.items():
+                    if dep_name in visited_names and ancestors is None:
+                        ancestors = _path_names(path)
+                    if ancestors is not None and dep_name in ancestors:
+                        trail = _path_trail(path) + [dep_name]
+                        print(f"Цикл обнаружен и пропущен: {' → '.join(trail)}", file=sys.stderr)
+                        continue
+                    next_frontier.append((dep_name, dep_version, depth + 1, (dep_name, path)))
+
+            frontier = next_frontier
 
     return graph
 
 
-def print_graph(graph: Dict[str, List[Tuple[str, str]]]) -> None:
+def print_graph(graph: DependencyGraph) -> None:
     if not graph:
         print("Граф зависимостей пуст.")
         return
-    print("Граф зависимостей:")
-    for node in sorted(graph.keys()):
-        deps = graph[node]
-        if deps:
-            dep_str = ", ".join(f"{n}@{v}" for n, v in deps)
-            print(f"{node} -> {dep_str}")
-        else:
-            print(f"{node} -> (нет зависимостей)")
-
-
-def invert_graph(graph: Dict[str, List[Tuple[str, str]]]) -> Dict[str, List[str]]:
-    inv: Dict[str, List[str]] = {}
-    for pkg, deps in graph.items():
-        for dep_name, dep_ver in deps:
-            dep_key = f"{dep_name}@{dep_ver}"
-            inv.setdefault(dep_key, []).append(pkg)
-    return inv
-
-
-def print_reverse_deps(graph: Dict[str, List[Tuple[str, str]]], target: str) -> None:
-    inv = invert_graph(graph)
-    if target in inv:
-        print(f"\nОбратные зависимости для {target}:")
-        for depender in sorted(inv[target]):
-            print(f"  ← {depender}")
+    labels = graph.node_labels
+    adj = graph.forward
+    lines = ["Граф зависимостей:"]
+    lines.extend(
+        f"{labels[node_id]} -> " + ", ".join(labels[dep_id] for dep_id in adj[node_id])
+        if adj[node_id] else f"{labels[node_id]} -> (нет зависимостей)"
+        for node_id in sorted(adj, key=labels.__getitem__)
+    )
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def print_reverse_deps(graph: DependencyGraph, target: str) -> None:
+    # Имя пакета содержит "@" только первым символом (scoped-пакеты), а версия
+    # может содержать его дальше (например, "npm:other@1.0").
+    split_at = target.find("@", 1)
+    target_id = graph.pair_ids.get((target[:split_at], target[split_at + 1:])) if split_at > 0 else None
+    if target_id in graph.reverse:
+        labels = graph.node_labels
+        lines = [f"\nОбратные зависимости для {target}:"]
+        lines.extend(f"  ← {depender}" for depender in sorted(labels[src] for src in graph.reverse[target_id]))
+        sys.stdout.write("\n".join(lines) + "\n")
     else:
         print(f"\nОбратные зависимости для {target} не найдены.")
 
@@ -164,9 +475,9 @@ def main():
         sys.exit(1)
 
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = toml.load(f)
-    except toml.TomlDecodeError as e:
+        with open(config_path, "rb") as f:
+            config = tomllib.load(f)
+    except tomllib.TOMLDecodeError as e:
         print(f"Ошибка разбора TOML: {e}", file=sys.stderr)
         sys.exit(1)
     except Exception as e: